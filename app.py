@@ -1,162 +1,281 @@
+import codecs
+import csv
+import io
+import json
 import streamlit as st
 import pandas as pd
 import numpy as np
-import webbrowser
 import urllib.parse
-import time
-import shutil
-import os
 import streamlit.components.v1 as components
 
+# Bound once at import so the per-URL loop skips the two-level attribute lookup
+_quote_from_bytes = urllib.parse.quote_from_bytes
+
 st.set_page_config(page_title="Subsidiary Search Automation", page_icon="🔍", layout="centered")
 
+PAGE_SIZE = 50
+MAX_ROWS = 5000
+
 st.title("🔍 Subsidiary Search Automation")
 st.markdown("""
 Upload your CSV file with columns **Account Name** and **Parent Name**. The application will generate Google search links for you.
 """)
 
-def create_search_query(account_name, parent_name):
-    return f"Is {account_name} a subsidiary of the {parent_name}?"
+@st.cache_data(show_spinner=False)
+def detect_dialect(sample: bytes):
+    """Best-effort detection of the encoding and separator from the first
+    chunk of the file, so most users never need the manual overrides.
+    Only utf-8 and cp1252 are considered — the encodings this app has
+    always accepted; a wider guess (chardet-style) can pick an arbitrary
+    8-bit codec that decodes every byte and silently mangles names."""
+    try:
+        # Incremental decode so a multi-byte char cut off at the sample
+        # boundary doesn't disqualify valid utf-8
+        decoded = codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        encoding = 'utf-8'
+    except UnicodeDecodeError:
+        decoded = sample.decode('cp1252', errors='replace')
+        encoding = 'cp1252'
+    try:
+        sep = csv.Sniffer().sniff(decoded, delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ','
+    return encoding, sep
+
+@st.cache_data(show_spinner=False)
+def load_and_prepare(file_bytes: bytes, sep: str, encoding: str):
+    """Parse the uploaded CSV, clean the key columns and build the search
+    queries/URLs. Cached on the raw upload bytes and the separator so
+    widget interactions (checkboxes, ranges) don't re-run the pipeline."""
+    # Cheap header-only read to resolve usecols, since real headers may
+    # carry padding that gets stripped below
+    header = pd.read_csv(io.BytesIO(file_bytes), encoding=encoding, encoding_errors='replace', sep=sep, nrows=0)
+    wanted = [col for col in header.columns if col.strip() in ('Account Name', 'Parent Name')]
+    # Only restrict columns when both were found; otherwise read everything
+    # so the caller reports the missing column instead of a parse error
+    usecols = wanted if len(wanted) == 2 else None
+    try:
+        # Multithreaded parse restricted to the two needed columns, with
+        # Arrow-backed strings for the cleaning steps below
+        df = pd.read_csv(io.BytesIO(file_bytes), encoding=encoding, sep=sep,
+                         engine='pyarrow', dtype_backend='pyarrow',
+                         usecols=usecols)
+    except (ImportError, ValueError):
+        df = pd.read_csv(io.BytesIO(file_bytes), encoding=encoding, encoding_errors='replace', sep=sep,
+                         usecols=usecols)
+    if df.empty or len(df.columns) < 2:
+        raise ValueError("No columns to parse from file or file is empty.")
+
+    # Strip whitespace from column headers to ensure checks pass
+    df.columns = [col.strip() for col in df.columns]
+
+    # Let the caller report the missing-columns error
+    if not {'Account Name', 'Parent Name'}.issubset(df.columns):
+        return df, np.empty(0, dtype=object), 0
+
+    # --- Data Cleaning ---
+    # Strip whitespace from key columns. On Arrow-backed strings this
+    # dispatches to the utf8_trim_whitespace kernel; no blanket astype(str)
+    # means no PyObject boxing and no 'nan' string artifacts to scrub
+    # afterwards. Columns that parsed as numeric (all-digit names) still
+    # need a cast before the .str accessor works
+    for col in ('Account Name', 'Parent Name'):
+        if not pd.api.types.is_string_dtype(df[col]):
+            try:
+                df[col] = df[col].astype('string[pyarrow]')
+            except ImportError:
+                df[col] = df[col].astype(str)
+        df[col] = df[col].str.strip()
+
+    # Drop rows with a missing or empty key column in one mask + gather,
+    # rather than separate mask, dropna and reset_index passes
+    invalid = (df['Account Name'].isna() | (df['Account Name'] == '')
+               | df['Parent Name'].isna() | (df['Parent Name'] == ''))
+    df = df.loc[~invalid]
+
+    # Duplicate (Account, Parent) pairs would produce identical URLs and rows
+    len_before = len(df)
+    df = df.drop_duplicates(subset=['Account Name', 'Parent Name']).reset_index(drop=True)
+    n_duplicates = len_before - len(df)
+    # --- End of Data Cleaning ---
 
-def create_google_search_url(query):
-    encoded_query = urllib.parse.quote_plus(query)
-    return f"https://www.google.com/search?q={encoded_query}"
+    # Build the queries in a single Arrow join kernel pass over contiguous
+    # string buffers and encode the URLs in the same sweep, so only the
+    # final URL list is materialized. quote_from_bytes with safe=b'' plus
+    # the %20 -> + rewrite matches quote_plus output; the Arrow binary cast
+    # hands over the UTF-8 bytes without a per-query str -> bytes encode
+    prefix = "https://www.google.com/search?q="
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        queries = pc.binary_join_element_wise(
+            'Is ', pa.array(df['Account Name'], type=pa.string()),
+            ' a subsidiary of the ', pa.array(df['Parent Name'], type=pa.string()),
+            '?', '')
+        search_urls = [prefix + _quote_from_bytes(b, safe=b'').replace('%20', '+')
+                       for b in queries.cast(pa.binary()).to_pylist()]
+    except ImportError:
+        search_urls = [prefix + _quote_from_bytes(f"Is {a} a subsidiary of the {p}?".encode('utf-8'), safe=b'').replace('%20', '+')
+                       for a, p in zip(df['Account Name'].to_numpy(), df['Parent Name'].to_numpy())]
+    df['Search URL'] = search_urls
+    # Object ndarray: range slices are views and selection gathers are fancy indexing
+    return df, np.asarray(search_urls, dtype=object), n_duplicates
+
+def open_links(urls, delay_ms):
+    """Open URLs in new tabs, staggered with setTimeout so a big batch
+    doesn't freeze the browser."""
+    components.html(
+        f"<script>const urls = {json.dumps(urls)}; const delay = {int(delay_ms)}; let i = 0; "
+        "(function next() { if (i >= urls.length) return; window.open(urls[i++], '_blank'); setTimeout(next, delay); })();"
+        "</script>",
+        height=0,
+    )
 
 uploaded_file = st.file_uploader("Upload CSV", type=["csv"])
 
 if uploaded_file:
     st.markdown("**Preview of uploaded file (first 10 lines):**")
-    raw_lines = uploaded_file.getvalue().decode(errors='replace').splitlines()
-    st.code("\n".join(raw_lines[:10]), language='text')
+    # Decode only the first few KB for the preview instead of the whole file
+    head_bytes = uploaded_file.getvalue()[:8192]
+    preview_lines = head_bytes.decode(errors='replace').splitlines()[:10]
+    st.code("\n".join(preview_lines), language='text')
 
-    sep = st.selectbox("Select the separator used in your CSV file:", options=[", (comma)", "; (semicolon)", "\t (tab)", "| (pipe)"], index=0)
+    # Detect encoding and separator once from a sample; the selectboxes stay
+    # as manual overrides for files the sniffer gets wrong
+    detected_enc, detected_sep = detect_dialect(uploaded_file.getvalue()[:65536])
+    sep = st.selectbox("Select the separator used in your CSV file:", options=["auto (detected)", ", (comma)", "; (semicolon)", "\t (tab)", "| (pipe)"], index=0)
     sep_map = {", (comma)": ",", "; (semicolon)": ";", "\t (tab)": "\t", "| (pipe)": "|"}
-    actual_sep = sep_map[sep]
+    actual_sep = detected_sep if sep == "auto (detected)" else sep_map[sep]
+    enc = st.selectbox("Select the file encoding:", options=["auto (detected)", "utf-8", "cp1252", "latin-1"], index=0)
+    actual_enc = detected_enc if enc == "auto (detected)" else enc
 
-    # Reset file pointer before reading with pandas
-    uploaded_file.seek(0)
     try:
-        try:
-            df = pd.read_csv(uploaded_file, encoding='utf-8', sep=actual_sep)
-        except UnicodeDecodeError:
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, encoding='cp1252', sep=actual_sep)
-        if df.empty or len(df.columns) < 2:
-            raise ValueError("No columns to parse from file or file is empty.")
+        df, search_urls, n_duplicates = load_and_prepare(uploaded_file.getvalue(), actual_sep, actual_enc)
     except Exception as e:
         st.error(f"Error reading CSV file: {e}")
         st.warning("Check the file preview above and make sure you selected the correct separator and that the file is not empty.")
         st.stop()
 
-    # Strip whitespace from column headers to ensure checks pass
-    df.columns = [col.strip() for col in df.columns]
-
     if not {'Account Name', 'Parent Name'}.issubset(df.columns):
         st.error("CSV must contain 'Account Name' and 'Parent Name' columns.")
         st.stop()
 
-    # --- Data Cleaning ---
-    # Strip whitespace from key columns
-    df['Account Name'] = df['Account Name'].astype(str).str.strip()
-    df['Parent Name'] = df['Parent Name'].astype(str).str.strip()
-
-    # Replace empty strings and the string 'nan' (a side-effect of .astype(str)) with a proper NaN value
-    df.replace(['', 'nan', 'Nan', 'NAN'], np.nan, inplace=True)
-
-    # Drop rows where 'Account Name' or 'Parent Name' is missing
-    df.dropna(subset=['Account Name', 'Parent Name'], inplace=True)
-
-    # Reset index after dropping rows, so iteration is clean
-    df.reset_index(drop=True, inplace=True)
-    
     # Check if DataFrame is empty after cleaning
     if df.empty:
         st.warning("No valid data found after cleaning. Please ensure your file has rows with both 'Account Name' and 'Parent Name' populated.")
         st.stop()
-    # --- End of Data Cleaning ---
 
-    search_queries = [create_search_query(row['Account Name'], row['Parent Name']) for _, row in df.iterrows()]
-    search_urls = [create_google_search_url(q) for q in search_queries]
+    # Bound the worst case: a huge file would otherwise stall every rerun
+    if len(df) > MAX_ROWS:
+        st.warning(f"File has {len(df)} rows; only the first {MAX_ROWS} are kept. Please split larger files into batches.")
+        df = df.head(MAX_ROWS)
+        search_urls = search_urls[:MAX_ROWS]
+
     total = len(search_urls)
 
     st.success(f"CSV loaded successfully! {total} queries found.")
-    df['Search URL'] = search_urls
-    st.dataframe(df[['Account Name', 'Parent Name', 'Search URL']], use_container_width=True)
-
-    st.markdown("---")
+    if n_duplicates:
+        st.info(f"Removed {n_duplicates} duplicate rows.")
 
-    # Initialize session state for selections and range.
+    # Initialize session state for selections and the range inputs.
     # This block runs only when a new file is uploaded (total changes) or on first run.
-    if 'selections' not in st.session_state or len(st.session_state.get('selections', [])) != total:
-        st.session_state.selections = [False] * total
+    if st.session_state.get('link_total') != total:
+        st.session_state.link_total = total
+        # One byte per row instead of a Python bool object per row
+        st.session_state.selections = np.zeros(total, dtype=bool)
+        st.session_state.editor_nonce = 0
         st.session_state.start_range = 1
         st.session_state.end_range = min(10, total)
 
     def update_selections(select_all):
-        st.session_state.selections = [select_all] * total
-
-    st.subheader("Manage and Open Links")
-
-    # --- Option 1: Open by individual selection ---
-    with st.expander("Option 1: Open by Individual Selection", expanded=True):
-        st.markdown("Use checkboxes below to select links, then open them here.")
-        col1, col2, col3 = st.columns([1, 1, 2])
-        with col1:
-            st.button("Select All", on_click=update_selections, args=(True,), use_container_width=True)
-        with col2:
-            st.button("Deselect All", on_click=update_selections, args=(False,), use_container_width=True)
-        with col3:
-            if st.button("Open Selected Links", use_container_width=True, type="primary"):
-                selected_urls = [search_urls[i] for i, s in enumerate(st.session_state.selections) if s]
+        st.session_state.selections[:] = select_all
+        # New editor key so stale per-page edits don't override the bulk update
+        st.session_state.editor_nonce += 1
+
+    # Paginate the table so rerun cost is O(PAGE_SIZE), not O(total)
+    n_pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+    page = st.number_input("Page", min_value=1, max_value=n_pages, step=1) - 1
+    start = page * PAGE_SIZE
+    end = min(start + PAGE_SIZE, total)
+    st.caption(f"Showing rows {start + 1}-{end} of {total}.")
+
+    # One virtualized table with a checkbox column instead of one
+    # st.checkbox/st.markdown pair per row
+    df_display = df.iloc[start:end][['Account Name', 'Parent Name', 'Search URL']].copy()
+    df_display.insert(0, 'Select', st.session_state.selections[start:end])
+    edited = st.data_editor(
+        df_display,
+        column_config={
+            'Select': st.column_config.CheckboxColumn('Select', default=False),
+            'Search URL': st.column_config.LinkColumn('Search URL'),
+        },
+        disabled=['Account Name', 'Parent Name', 'Search URL'],
+        use_container_width=True,
+        key=f'editor_{page}_{st.session_state.editor_nonce}',
+    )
+    # Persist this page's checkboxes so selections survive page changes
+    st.session_state.selections[start:end] = edited['Select'].to_numpy(dtype=bool)
+
+    st.markdown("---")
+
+    # Fragment: button clicks in here rerun only this section, not the
+    # parse/clean pipeline or the table above
+    @st.fragment
+    def open_controls(search_urls, total):
+        st.subheader("Manage and Open Links")
+        tab_delay = st.slider("Tab open delay (ms)", 0, 500, 80, help="Pause between new tabs. Raise this if your browser stutters when opening many links at once.")
+
+        # --- Option 1: Open by individual selection ---
+        with st.expander("Option 1: Open by Individual Selection", expanded=True):
+            st.markdown("Tick the 'Select' column in the table above (selections are kept across pages), then open the links here.")
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                # Bulk updates change the table outside the fragment, so force a full rerun
+                if st.button("Select All", use_container_width=True):
+                    update_selections(True)
+                    st.rerun(scope="app")
+            with col2:
+                if st.button("Deselect All", use_container_width=True):
+                    update_selections(False)
+                    st.rerun(scope="app")
+            with col3:
+                open_selected = st.button("Open Selected Links", use_container_width=True, type="primary")
+            if open_selected:
+                selected_urls = search_urls[st.session_state.selections].tolist()
                 if selected_urls:
-                    js_code = "".join([f"window.open('{url}', '_blank');" for url in selected_urls])
-                    components.html(f"<script>{js_code}</script>", height=0)
+                    open_links(selected_urls, tab_delay)
                     st.success(f"Attempting to open {len(selected_urls)} selected links.")
                     st.info("If new tabs did not open, please check if your browser is blocking pop-ups and allow them for this site.")
                 else:
                     st.warning("No links were selected to open.")
 
-    # --- Option 2: Open by range ---
-    with st.expander("Option 2: Open a Range of Links"):
-        st.markdown("Directly open a range of links without using checkboxes.")
-        r_col1, r_col2, r_col3 = st.columns([1, 1, 1.5])
-        with r_col1:
-            st.number_input("From link #", min_value=1, max_value=total, step=1, key="start_range")
-        with r_col2:
-            st.number_input("To link #", min_value=1, max_value=total, step=1, key="end_range")
-        with r_col3:
-            st.write("&#8203;") # Vertical alignment hack
-            if st.button("Open Range", use_container_width=True):
-                # Adjust for 0-based indexing for slicing from session state
-                start_idx = st.session_state.start_range - 1
-                end_idx = st.session_state.end_range
-                
-                if start_idx >= end_idx:
-                    st.warning("The 'From' value must be smaller than the 'To' value.")
-                else:
-                    range_urls = search_urls[start_idx:end_idx]
-                    if range_urls:
-                        js_code = "".join([f"window.open('{url}', '_blank');" for url in range_urls])
-                        components.html(f"<script>{js_code}</script>", height=0)
-                        st.success(f"Attempting to open links {st.session_state.start_range} through {st.session_state.end_range}.")
-                        st.info("If pop-ups are blocked, please enable them for this site.")
+        # --- Option 2: Open by range ---
+        with st.expander("Option 2: Open a Range of Links"):
+            st.markdown("Directly open a range of links without using checkboxes.")
+            r_col1, r_col2, r_col3 = st.columns([1, 1, 1.5])
+            with r_col1:
+                st.number_input("From link #", min_value=1, max_value=total, step=1, key="start_range")
+            with r_col2:
+                st.number_input("To link #", min_value=1, max_value=total, step=1, key="end_range")
+            with r_col3:
+                st.write("&#8203;") # Vertical alignment hack
+                if st.button("Open Range", use_container_width=True):
+                    # Adjust for 0-based indexing for slicing from session state
+                    start_idx = st.session_state.start_range - 1
+                    end_idx = st.session_state.end_range
+
+                    if start_idx >= end_idx:
+                        st.warning("The 'From' value must be smaller than the 'To' value.")
                     else:
-                        st.error("Could not find links for the specified range.")
+                        range_urls = search_urls[start_idx:end_idx].tolist()
+                        if range_urls:
+                            open_links(range_urls, tab_delay)
+                            st.success(f"Attempting to open links {st.session_state.start_range} through {st.session_state.end_range}.")
+                            st.info("If pop-ups are blocked, please enable them for this site.")
+                        else:
+                            st.error("Could not find links for the specified range.")
 
-    st.markdown("---")
-    st.subheader("Generated Search Links")
-
-    for i, (url, query) in enumerate(zip(search_urls, search_queries)):
-        col1, col2 = st.columns([0.1, 3])
-        with col1:
-            st.session_state.selections[i] = st.checkbox(
-                "select", 
-                value=st.session_state.selections[i], 
-                key=f"cb_{i}", 
-                label_visibility="collapsed"
-            )
-        with col2:
-            st.markdown(f"{i+1}. <a href='{url}' target='_blank'>Search for: {query}</a>", unsafe_allow_html=True)
+    open_controls(search_urls, total)
 
 else:
     st.info("Please upload a CSV file to begin.") 
\ No newline at end of file